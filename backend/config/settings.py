@@ -1,6 +1,5 @@
 import os
 from pathlib import Path
-from gqlauth.settings_type import GqlAuthSettings
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent
@@ -12,10 +11,15 @@ DEBUG = os.getenv("DEBUG", default="False") == "True"
 ALLOWED_HOSTS = os.getenv("ALLOWED_HOSTS", "127.0.0.1").split(",")
 CSRF_TRUSTED_ORIGINS = os.getenv("CSRF_TRUSTED_ORIGINS", "127.0.0.1").split(",")
 
+# Process profile: "web", "worker" or "beat". Worker and beat processes never serve
+# GraphQL or the admin, so they skip the GraphQL/auth apps and admin autodiscovery.
+PROCESS_TYPE = os.getenv("PROCESS_TYPE", "web")
+IS_WEB_PROCESS = PROCESS_TYPE == "web"
+
 # Application definition
 
 INSTALLED_APPS = [
-    'django.contrib.admin',
+    'django.contrib.admin' if IS_WEB_PROCESS else 'django.contrib.admin.apps.SimpleAdminConfig',
     'django.contrib.auth',
     'django.contrib.contenttypes',
     'django.contrib.sessions',
@@ -23,36 +27,48 @@ INSTALLED_APPS = [
     'django.contrib.staticfiles',
 
     # third-party apps
-    'strawberry.django',
-    'gqlauth',
-    'gqlauth.user',
     'django_celery_beat',
 
     # my apps
     'devices',
 ]
 
+if IS_WEB_PROCESS:
+    INSTALLED_APPS += [
+        'strawberry.django',
+        'gqlauth',
+        'gqlauth.user',
+    ]
+
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
-    'gqlauth.core.middlewares.django_jwt_middleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+if IS_WEB_PROCESS:
+    MIDDLEWARE.insert(
+        MIDDLEWARE.index('django.contrib.auth.middleware.AuthenticationMiddleware') + 1,
+        'gqlauth.core.middlewares.django_jwt_middleware',
+    )
+
 AUTHENTICATION_BACKENDS = [
     "django.contrib.auth.backends.ModelBackend",
 ]
 
-GQL_AUTH = GqlAuthSettings(
-    LOGIN_REQUIRE_CAPTCHA=False,
-    REGISTER_REQUIRE_CAPTCHA=False,
-)
+if IS_WEB_PROCESS:
+    from gqlauth.settings_type import GqlAuthSettings
 
-ROOT_URLCONF = 'config.urls'
+    GQL_AUTH = GqlAuthSettings(
+        LOGIN_REQUIRE_CAPTCHA=False,
+        REGISTER_REQUIRE_CAPTCHA=False,
+    )
+
+ROOT_URLCONF = 'config.urls' if IS_WEB_PROCESS else 'config.worker_urls'
 
 TEMPLATES = [
     {
@@ -91,6 +107,17 @@ CELERY_ACCEPT_CONTENT = ["json"]
 CELERY_TASK_SERIALIZER = "json"
 CELERY_BEAT_SCHEDULER = "django_celery_beat.schedulers:DatabaseScheduler"
 
+# Simulation ticks: expected beat interval and the lease held by a running tick
+SIMULATION_TICK_INTERVAL_SECONDS = int(os.getenv("SIMULATION_TICK_INTERVAL_SECONDS", 60))
+SIMULATION_LOCK_TIMEOUT_SECONDS = int(os.getenv("SIMULATION_LOCK_TIMEOUT_SECONDS", 300))
+
+# GraphQL
+GRAPHQL_MAX_QUERY_COST = int(os.getenv("GRAPHQL_MAX_QUERY_COST", 1000))
+GRAPHQL_DEFAULT_LIST_SIZE = int(os.getenv("GRAPHQL_DEFAULT_LIST_SIZE", 50))
+GRAPHQL_DOCUMENT_CACHE_SIZE = int(os.getenv("GRAPHQL_DOCUMENT_CACHE_SIZE", 256))
+GRAPHQL_PERSISTED_QUERY_TTL_SECONDS = int(os.getenv("GRAPHQL_PERSISTED_QUERY_TTL_SECONDS", 86400))
+GRAPHQL_PERSISTED_QUERY_MAX_LENGTH = int(os.getenv("GRAPHQL_PERSISTED_QUERY_MAX_LENGTH", 10000))
+
 
 AUTH_PASSWORD_VALIDATORS = [
     {
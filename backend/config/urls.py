@@ -18,8 +18,10 @@ from django.contrib import admin
 from django.urls import path
 from strawberry.django.views import GraphQLView
 from config.schema import schema
+from devices.views import export_devices
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path("graphql/", GraphQLView.as_view(schema=schema)),
+    path("export/devices/<str:device_type>/", export_devices),
 ]
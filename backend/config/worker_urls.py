@@ -0,0 +1,8 @@
+"""
+URL configuration for the worker and beat process profiles.
+
+They never serve HTTP, but Django's system checks still import ROOT_URLCONF;
+using this empty one keeps the GraphQL schema and admin out of those processes.
+"""
+
+urlpatterns = []
@@ -1,13 +1,63 @@
 from django.contrib import admin
-from .models import ProductionDevice, StorageDevice, ConsumptionDevice
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+from .models import (
+    User, ProductionDevice, StorageDevice, ConsumptionDevice, UserGroup, Tariff, TariffRate, UserTariff
+)
+
+# below this many rows an exact COUNT(*) is cheap enough
+ESTIMATED_COUNT_THRESHOLD = 100000
+
+class EstimatedCountPaginator(Paginator):
+    '''
+        Uses the Postgres planner estimate (pg_class.reltuples) as the row count for
+        unfiltered changelists of large tables, instead of a full COUNT(*).
+    '''
+    @cached_property
+    def count(self):
+        queryset = self.object_list
+        connection = connections[queryset.db]
+        if connection.vendor == "postgresql" and not queryset.query.where:
+            with connection.cursor() as cursor:
+                cursor.execute(
+                    "SELECT reltuples FROM pg_class WHERE oid = %s::regclass",
+                    [queryset.model._meta.db_table],
+                )
+                row = cursor.fetchone()
+            if row and row[0] >= ESTIMATED_COUNT_THRESHOLD:
+                return int(row[0])
+        return super().count
 
 class BaseRestrictedAdmin(admin.ModelAdmin):
+    list_select_related = ("user",)
+    paginator = EstimatedCountPaginator
+    # avoids a second COUNT(*) over the whole table when searching/filtering
+    show_full_result_count = False
+    # matched as a single prefix, see get_search_results
+    search_fields = ("name", "user__username")
+
     def get_queryset(self, request):
         qs = super().get_queryset(request)
         if request.user.is_superuser:
             return qs
         return qs.filter(user=request.user)
 
+    def get_search_results(self, request, queryset, search_term):
+        '''
+            Matches the whole search term, spaces included, as one prefix instead of
+            Django's default of requiring every word to match: a case-insensitive prefix of
+            the device name (UPPER(name) index) or a case-sensitive prefix of the owner's
+            username, so auth_user's own username index can serve the owner subquery.
+        '''
+        search_term = search_term.strip()
+        if not search_term:
+            return queryset, False
+
+        owners = User.objects.filter(username__startswith=search_term).values("pk")
+        return queryset.filter(Q(name__istartswith=search_term) | Q(user__in=owners)), False
+
     def has_view_permission(self, request, obj=None):
         if request.user.is_superuser:
             return True
@@ -34,7 +84,6 @@ class ProductionDeviceAdmin(BaseRestrictedAdmin):
         "updated_at"
     )
     list_filter = ("status",)
-    search_fields = ("name", "user__username")
 
 
 @admin.register(StorageDevice)
@@ -49,7 +98,6 @@ class StorageDeviceAdmin(BaseRestrictedAdmin):
         "updated_at",
     )
     list_filter = ("status",)
-    search_fields = ("name", "user__username")
 
 
 @admin.register(ConsumptionDevice)
@@ -62,4 +110,30 @@ class ConsumptionDeviceAdmin(BaseRestrictedAdmin):
         "updated_at"
     )
     list_filter = ("status",)
-    search_fields = ("name", "user__username")
+
+
+@admin.register(UserGroup)
+class UserGroupAdmin(admin.ModelAdmin):
+    list_display = ("name", "parent")
+    list_select_related = ("parent",)
+    search_fields = ("name",)
+    raw_id_fields = ("parent", "members", "operators")
+
+
+class TariffRateInline(admin.TabularInline):
+    model = TariffRate
+    extra = 0
+
+
+@admin.register(Tariff)
+class TariffAdmin(admin.ModelAdmin):
+    list_display = ("name", "import_price", "export_price", "is_default")
+    inlines = (TariffRateInline,)
+
+
+@admin.register(UserTariff)
+class UserTariffAdmin(admin.ModelAdmin):
+    list_display = ("user", "tariff")
+    list_select_related = ("user", "tariff")
+    search_fields = ("user__username__startswith",)
+    raw_id_fields = ("user",)
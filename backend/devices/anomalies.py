@@ -0,0 +1,97 @@
+import math
+import time
+
+# EWMA smoothing factor for the per-device mean/variance
+EWMA_ALPHA = 0.1
+# readings this many standard deviations above the mean count as a spike
+SPIKE_THRESHOLD = 4
+# ticks of history needed before spikes are reported
+WARMUP_TICKS = 10
+# floor for the standard deviation used in spike detection, so that a device with a
+# perfectly steady load (variance ~0) can still report a spike
+MIN_STD_FRACTION = 0.1
+MIN_STD_WATTS = 50
+# consecutive ticks a reading has to stay stuck before it is reported
+STUCK_TICKS = 3
+
+ALERTS_STREAM_KEY = "device_alerts"
+USER_ALERTS_STREAM_KEY = "device_alerts:{}"
+ALERTS_STREAM_MAXLEN = 10000
+USER_ALERTS_STREAM_MAXLEN = 100
+# the state hash is read and written in chunks so no single command blocks Redis
+STATE_SCAN_COUNT = 10000
+STATE_WRITE_BATCH = 10000
+
+
+class AnomalyDetector:
+    '''
+        Flags faulty devices from the readings of one simulation tick.
+
+        Every device keeps O(1) streaming state (EWMA mean, EWMA variance, stuck streak,
+        reading count), held in one Redis hash per device type and loaded/saved once
+        per tick in chunks of STATE_SCAN_COUNT / STATE_WRITE_BATCH fields. Alerts go to
+        the device_alerts stream and to a short per-user stream.
+    '''
+
+    def __init__(self, redis_client, device_type):
+        self.r = redis_client
+        self.state_key = f"anomaly_state:{device_type}"
+        self.device_type = device_type
+        self.state = {
+            device_id: [float(v) for v in value.split(",")]
+            for device_id, value in self.r.hscan_iter(self.state_key, count=STATE_SCAN_COUNT)
+        }
+        self.updated = {}
+        self.alerts = []
+
+    def observe(self, device, value, stuck=False, detect_spikes=False):
+        '''
+            Records one reading. stuck marks readings that are suspicious on their own
+            (e.g. a solar inverter at 0 W in daylight); they are reported once they
+            persist for STUCK_TICKS ticks in a row. With detect_spikes, readings far
+            above the device's EWMA mean are reported as spikes.
+        '''
+        mean, var, streak, count = self.state.get(str(device.id), (value, 0.0, 0, 0))
+
+        streak = streak + 1 if stuck else 0
+        if streak == STUCK_TICKS:
+            self.alert(device, "stuck", value)
+
+        diff = value - mean
+        if detect_spikes and count >= WARMUP_TICKS:
+            std = max(math.sqrt(var), MIN_STD_FRACTION * abs(mean), MIN_STD_WATTS)
+            if diff > SPIKE_THRESHOLD * std:
+                self.alert(device, "spike", value)
+
+        incr = EWMA_ALPHA * diff
+        mean += incr
+        var = (1 - EWMA_ALPHA) * (var + diff * incr)
+
+        self.updated[device.id] = f"{mean:.2f},{var:.2f},{int(streak)},{int(count) + 1}"
+
+    def alert(self, device, kind, value):
+        self.alerts.append({
+            "device_type": self.device_type,
+            "device_id": device.id,
+            "user_id": device.user_id,
+            "kind": kind,
+            "value": value,
+        })
+
+    def flush(self, tick):
+        updated = list(self.updated.items())
+        for start in range(0, len(updated), STATE_WRITE_BATCH):
+            self.r.hset(self.state_key, mapping=dict(updated[start:start + STATE_WRITE_BATCH]))
+
+        pipe = self.r.pipeline(transaction=False)
+        timestamp = int(time.time())
+        for alert in self.alerts:
+            alert.update(tick=tick, timestamp=timestamp)
+            pipe.xadd(ALERTS_STREAM_KEY, alert, maxlen=ALERTS_STREAM_MAXLEN, approximate=True)
+            pipe.xadd(
+                USER_ALERTS_STREAM_KEY.format(alert["user_id"]),
+                alert,
+                maxlen=USER_ALERTS_STREAM_MAXLEN,
+                approximate=True,
+            )
+        pipe.execute()
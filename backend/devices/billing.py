@@ -0,0 +1,88 @@
+from django.utils import timezone
+
+from devices.models import Tariff, TariffRate, UserTariff
+
+# prices are looked up in per-tariff tables with one entry per slot of the day
+SLOT_MINUTES = 15
+SLOTS_PER_DAY = 24 * 60 // SLOT_MINUTES
+
+BILLING_KEY = "billing:{}:{}"  # user id, YYYY-MM
+
+
+def build_price_tables():
+    '''
+        Precomputes {tariff_id: (import_prices, export_prices)}, each a list with one
+        price per SLOT_MINUTES slot of the day, so billing a reading is a list lookup.
+    '''
+    tables = {
+        tariff.id: (
+            [float(tariff.import_price)] * SLOTS_PER_DAY,
+            [float(tariff.export_price)] * SLOTS_PER_DAY,
+        )
+        for tariff in Tariff.objects.all()
+    }
+
+    for rate in TariffRate.objects.all():
+        import_prices, export_prices = tables[rate.tariff_id]
+        start = get_slot(rate.start_time)
+        end = get_slot(rate.end_time)
+        slots = range(start, end) if start < end else [*range(start, SLOTS_PER_DAY), *range(0, end)]
+        for slot in slots:
+            import_prices[slot] = float(rate.import_price)
+            export_prices[slot] = float(rate.export_price)
+
+    return tables
+
+
+def get_slot(value):
+    return (value.hour * 60 + value.minute) // SLOT_MINUTES
+
+
+class BillingEngine:
+    '''
+        Integrates each user's net grid flow over the tick into kWh, prices it with the
+        user's tariff and adds it to the running totals for the current month in Redis
+        (billing:<user_id>:<YYYY-MM>).
+
+        savings is what the user would have paid importing all of their consumption,
+        minus what they actually paid (imports less export credit).
+    '''
+
+    def __init__(self, redis_client, elapsed_seconds):
+        now = timezone.localtime()
+        self.r = redis_client
+        self.month = now.strftime("%Y-%m")
+        self.slot = get_slot(now)
+        self.hours = elapsed_seconds / 3600
+        self.price_tables = build_price_tables()
+        self.user_tariffs = dict(UserTariff.objects.values_list("user_id", "tariff_id"))
+        self.default_tariff_id = Tariff.objects.filter(is_default=True).values_list("id", flat=True).first()
+        self.pipe = self.r.pipeline(transaction=False)
+
+    def add(self, uid, energy_stats):
+        tariff_id = self.user_tariffs.get(uid, self.default_tariff_id)
+        if tariff_id is None:
+            return
+
+        import_prices, export_prices = self.price_tables[tariff_id]
+        import_price = import_prices[self.slot]
+        export_price = export_prices[self.slot]
+
+        net_kwh = energy_stats["net_grid_flow"] * self.hours / 1000
+        import_kwh = max(net_kwh, 0)
+        export_kwh = max(-net_kwh, 0)
+        consumption_kwh = energy_stats["current_consumption"] * self.hours / 1000
+
+        import_cost = import_kwh * import_price
+        export_credit = export_kwh * export_price
+        savings = consumption_kwh * import_price - (import_cost - export_credit)
+
+        key = BILLING_KEY.format(uid, self.month)
+        self.pipe.hincrbyfloat(key, "import_kwh", import_kwh)
+        self.pipe.hincrbyfloat(key, "export_kwh", export_kwh)
+        self.pipe.hincrbyfloat(key, "import_cost", import_cost)
+        self.pipe.hincrbyfloat(key, "export_credit", export_credit)
+        self.pipe.hincrbyfloat(key, "savings", savings)
+
+    def flush(self):
+        self.pipe.execute()
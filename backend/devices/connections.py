@@ -0,0 +1,12 @@
+from functools import cache
+
+
+@cache
+def get_redis():
+    '''
+        Returns the process-wide Redis client, created on first use rather than at import
+        so that processes which never touch Redis don't pay for it at startup.
+    '''
+    import redis
+
+    return redis.Redis(host="redis", port=6379, db=0, decode_responses=True)
@@ -0,0 +1,111 @@
+import csv
+import io
+
+from devices.utils import get_device_model_by_type
+
+EXPORT_FORMATS = ("csv", "arrow")
+CHUNK_SIZE = 5000
+
+
+def get_export_rows(device_type: str, user_id=None, since=None, until=None):
+    '''
+        Returns (fields, rows) for all devices of device_type, optionally filtered
+        by owner and by an updated_at range. Rows are streamed with a server-side
+        cursor so memory stays constant regardless of fleet size.
+    '''
+    model = get_device_model_by_type(device_type)
+    fields = model._meta.concrete_fields
+    columns = [field.attname for field in fields]
+
+    queryset = model.objects.order_by("pk")
+    if user_id is not None:
+        queryset = queryset.filter(user_id=user_id)
+    if since is not None:
+        queryset = queryset.filter(updated_at__gte=since)
+    if until is not None:
+        queryset = queryset.filter(updated_at__lt=until)
+
+    rows = queryset.values_list(*columns).iterator(chunk_size=CHUNK_SIZE)
+    return fields, rows
+
+
+def iter_export(export_format: str, device_type: str, **filters):
+    if export_format == "csv":
+        return iter_csv(device_type, **filters)
+    if export_format == "arrow":
+        return iter_arrow(device_type, **filters)
+    raise ValueError(f"Unsupported export format: {export_format}. Must be one of: {EXPORT_FORMATS}")
+
+
+def iter_csv(device_type: str, **filters):
+    '''
+        Yields the export as CSV, one encoded chunk per CHUNK_SIZE rows.
+    '''
+    fields, rows = get_export_rows(device_type, **filters)
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    writer.writerow([field.attname for field in fields])
+
+    for i, row in enumerate(rows, start=1):
+        writer.writerow(row)
+        if i % CHUNK_SIZE == 0:
+            yield buffer.getvalue().encode()
+            buffer.seek(0)
+            buffer.truncate()
+
+    yield buffer.getvalue().encode()
+
+
+def iter_arrow(device_type: str, **filters):
+    '''
+        Yields the export as an Arrow IPC stream, one record batch per CHUNK_SIZE rows.
+        pyarrow is only imported here, so it stays out of process startup.
+    '''
+    try:
+        import pyarrow as pa
+    except ImportError:
+        raise ValueError("Arrow export requires pyarrow to be installed")
+
+    fields, rows = get_export_rows(device_type, **filters)
+    schema = pa.schema([
+        pa.field(field.attname, get_arrow_type(pa, field), nullable=field.null) for field in fields
+    ])
+
+    def iter_batches():
+        batch = []
+        for row in rows:
+            batch.append(row)
+            if len(batch) == CHUNK_SIZE:
+                yield batch
+                batch = []
+        if batch:
+            yield batch
+
+    sink = io.BytesIO()
+    with pa.ipc.new_stream(sink, schema) as writer:
+        for batch in iter_batches():
+            columns = list(zip(*batch))
+            writer.write_batch(pa.record_batch(
+                [pa.array(column, type=schema.field(i).type) for i, column in enumerate(columns)],
+                schema=schema,
+            ))
+            yield sink.getvalue()
+            sink.seek(0)
+            sink.truncate()
+
+    # end-of-stream marker written when the writer is closed
+    yield sink.getvalue()
+
+
+def get_arrow_type(pa, field):
+    internal_type = field.get_internal_type()
+    if internal_type == "ForeignKey":
+        internal_type = field.target_field.get_internal_type()
+
+    if internal_type == "BooleanField":
+        return pa.bool_()
+    if internal_type == "DateTimeField":
+        return pa.timestamp("us", tz="UTC")
+    if internal_type in ("CharField", "TextField"):
+        return pa.string()
+    return pa.int64()
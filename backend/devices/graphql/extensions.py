@@ -0,0 +1,183 @@
+import hashlib
+import json
+
+from graphql import (
+    FieldNode,
+    FragmentSpreadNode,
+    GraphQLError,
+    GraphQLList,
+    GraphQLNonNull,
+    InlineFragmentNode,
+)
+from graphql.validation import ValidationRule
+from strawberry.extensions import AddValidationRules, SchemaExtension
+
+from devices.connections import get_redis
+
+PERSISTED_QUERY_KEY = "persisted_query:{}"
+
+
+class QueryCostLimiter(AddValidationRules):
+    '''
+        Rejects operations whose static cost exceeds max_cost.
+
+        Every selected field costs 1. Selections below a list field are multiplied
+        by list_size, since none of our list fields are paginated yet.
+        The cost is computed as a validation rule, so it is cached along with the
+        rest of the validation result by ValidationCache.
+    '''
+
+    def __init__(self, max_cost: int, list_size: int):
+        super().__init__([create_cost_rule(max_cost, list_size)])
+
+
+def create_cost_rule(max_cost: int, list_size: int) -> type[ValidationRule]:
+    class QueryCostRule(ValidationRule):
+        def enter_operation_definition(self, node, *args):
+            root_type = self.context.schema.get_root_type(node.operation)
+            if root_type is None:
+                return
+
+            cost = self.selection_cost(node.selection_set, root_type, set())
+            if cost > max_cost:
+                self.report_error(GraphQLError(
+                    f"Query cost {cost} exceeds the maximum allowed cost of {max_cost}",
+                    node,
+                ))
+
+        def selection_cost(self, selection_set, parent_type, visited_fragments):
+            cost = 0
+            for selection in selection_set.selections:
+                if isinstance(selection, FieldNode):
+                    cost += self.field_cost(selection, parent_type, visited_fragments)
+
+                elif isinstance(selection, InlineFragmentNode):
+                    fragment_type = parent_type
+                    if selection.type_condition:
+                        fragment_type = self.context.schema.get_type(selection.type_condition.name.value)
+                    if fragment_type is not None:
+                        cost += self.selection_cost(selection.selection_set, fragment_type, visited_fragments)
+
+                elif isinstance(selection, FragmentSpreadNode):
+                    # fragment cycles are reported by NoFragmentCyclesRule, just stop walking here
+                    name = selection.name.value
+                    fragment = self.context.get_fragment(name)
+                    if fragment is None or name in visited_fragments:
+                        continue
+                    fragment_type = self.context.schema.get_type(fragment.type_condition.name.value)
+                    if fragment_type is not None:
+                        cost += self.selection_cost(
+                            fragment.selection_set, fragment_type, visited_fragments | {name}
+                        )
+            return cost
+
+        def field_cost(self, node, parent_type, visited_fragments):
+            # introspection and unknown fields are left to the other validation rules
+            field = getattr(parent_type, "fields", {}).get(node.name.value)
+            if field is None:
+                return 0
+
+            multiplier = 1
+            field_type = field.type
+            while isinstance(field_type, (GraphQLNonNull, GraphQLList)):
+                if isinstance(field_type, GraphQLList):
+                    multiplier *= list_size
+                field_type = field_type.of_type
+
+            if not node.selection_set:
+                return 1
+            return 1 + multiplier * self.selection_cost(node.selection_set, field_type, visited_fragments)
+
+    return QueryCostRule
+
+
+class PersistedQueries(SchemaExtension):
+    '''
+        Automatic persisted queries: clients send
+        {"extensions": {"persistedQuery": {"version": 1, "sha256Hash": ...}}}
+        and may omit the query text once it has been registered.
+
+        The first request for a hash carries both the query and the hash. Once that
+        query has passed validation it is stored in Redis under persisted_query:<hash>
+        for ttl seconds and kept in a small per-process cache so repeat lookups skip Redis.
+        Queries longer than max_query_length are never registered.
+    '''
+
+    def __init__(self, ttl: int, max_query_length: int, local_cache_size: int = 1000):
+        self.ttl = ttl
+        self.max_query_length = max_query_length
+        self.local_cache_size = local_cache_size
+        self.local_cache = {}
+
+    def on_operation(self):
+        execution_context = self.execution_context
+        persisted_query = get_request_extensions(execution_context.context).get("persistedQuery")
+        register_hash = None
+
+        if persisted_query:
+            query_hash = persisted_query.get("sha256Hash")
+            if not isinstance(query_hash, str):
+                raise GraphQLError("Invalid persisted query: sha256Hash is required")
+
+            if execution_context.query:
+                if len(execution_context.query) > self.max_query_length:
+                    raise GraphQLError(
+                        f"Persisted queries are limited to {self.max_query_length} characters"
+                    )
+                if hashlib.sha256(execution_context.query.encode()).hexdigest() != query_hash:
+                    raise GraphQLError("Provided sha256Hash does not match query")
+                if query_hash not in self.local_cache:
+                    register_hash = query_hash
+            else:
+                query = self.lookup(query_hash)
+                if query is None:
+                    raise GraphQLError(
+                        "PersistedQueryNotFound",
+                        extensions={"code": "PERSISTED_QUERY_NOT_FOUND"},
+                    )
+                execution_context.query = query
+
+        yield
+
+        # the operation only gets executed once parsing and validation (including the
+        # query cost limit) have passed, so only register queries that got that far
+        if register_hash and execution_context.result is not None:
+            self.store(register_hash, execution_context.query)
+
+    def lookup(self, query_hash):
+        query = self.local_cache.get(query_hash)
+        if query is None:
+            query = get_redis().get(PERSISTED_QUERY_KEY.format(query_hash))
+            if query is not None:
+                self.cache_locally(query_hash, query)
+        return query
+
+    def store(self, query_hash, query):
+        get_redis().set(PERSISTED_QUERY_KEY.format(query_hash), query, ex=self.ttl)
+        self.cache_locally(query_hash, query)
+
+    def cache_locally(self, query_hash, query):
+        if len(self.local_cache) < self.local_cache_size:
+            self.local_cache[query_hash] = query
+
+
+def get_request_extensions(context) -> dict:
+    '''
+        Reads the "extensions" member of the GraphQL request, which strawberry's
+        view does not pass through to the schema.
+    '''
+    request = getattr(context, "request", None)
+    if request is None:
+        return {}
+
+    try:
+        if request.method == "GET":
+            extensions = json.loads(request.GET.get("extensions") or "{}")
+        elif request.content_type == "application/json":
+            extensions = json.loads(request.body).get("extensions") or {}
+        else:
+            return {}
+    except (ValueError, AttributeError):
+        return {}
+
+    return extensions if isinstance(extensions, dict) else {}
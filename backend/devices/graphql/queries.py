@@ -1,12 +1,13 @@
 import strawberry
-import redis
 import json
+from django.utils import timezone
 from typing import Optional
 
-from devices.models import ProductionDevice, ConsumptionDevice, StorageDevice
-from devices.graphql.types import DeviceType, EnergyStats, StorageStats
-
-r = redis.Redis(host="redis", port=6379, db=0, decode_responses=True)
+from devices.anomalies import USER_ALERTS_STREAM_KEY
+from devices.connections import get_redis
+from devices.billing import BILLING_KEY
+from devices.models import ProductionDevice, ConsumptionDevice, StorageDevice, UserGroup
+from devices.graphql.types import DeviceAlert, DeviceType, EnergyStats, GroupEnergyStats, MonthlyBill, StorageStats
 
 @strawberry.type
 class Query:
@@ -32,7 +33,7 @@ class Query:
         user = info.context.request.user
         key = f"energy_stats:{user.id}"
 
-        data = r.get(key)
+        data = get_redis().get(key)
         if not data:
             return None  #TODO: raise a custom error or fallback to DB logic
 
@@ -44,5 +45,82 @@ class Query:
             current_storage=StorageStats(**parsed["current_storage"]),
             current_storage_flow=parsed["current_storage_flow"],
             net_grid_flow=parsed["net_grid_flow"],
-            timestamp=parsed["timestamp"]
+            timestamp=parsed["timestamp"],
+            tick=parsed.get("tick")
+        )
+
+    @strawberry.field
+    def group_energy_stats(self, info, group_id: int) -> Optional[GroupEnergyStats]:
+        '''
+            groupEnergyStats API that returns stats aggregated over all users in a group
+            (and its sub-groups), precomputed by the simulation task
+        '''
+        user = info.context.request.user
+        if not user.is_authenticated:
+            raise ValueError("You must be logged in to view group stats.")
+        if not user.is_superuser and not UserGroup.objects.filter(id=group_id, operators=user).exists():
+            raise ValueError(f"No group found with ID {group_id} for this user.")
+
+        data = get_redis().get(f"group_energy_stats:{group_id}")
+        if not data:
+            return None
+
+        parsed = json.loads(data)
+
+        return GroupEnergyStats(
+            group_id=group_id,
+            user_count=parsed["user_count"],
+            current_production=parsed["current_production"],
+            current_consumption=parsed["current_consumption"],
+            current_storage=StorageStats(**parsed["current_storage"]),
+            current_storage_flow=parsed["current_storage_flow"],
+            net_grid_flow=parsed["net_grid_flow"],
+            timestamp=parsed["timestamp"],
+            tick=parsed.get("tick")
+        )
+
+    @strawberry.field
+    def device_alerts(self, info, limit: int = 20) -> list[DeviceAlert]:
+        '''
+            deviceAlerts API that returns the most recent anomaly alerts for the logged in user's devices
+        '''
+        user = info.context.request.user
+        entries = get_redis().xrevrange(USER_ALERTS_STREAM_KEY.format(user.id), count=min(limit, 100))
+
+        return [
+            DeviceAlert(
+                id=entry_id,
+                device_type=alert["device_type"],
+                device_id=int(alert["device_id"]),
+                kind=alert["kind"],
+                value=int(alert["value"]),
+                tick=int(alert["tick"]),
+                timestamp=int(alert["timestamp"])
+            )
+            for entry_id, alert in entries
+        ]
+
+    @strawberry.field
+    def monthly_bill(self, info, month: Optional[str] = None) -> Optional[MonthlyBill]:
+        '''
+            monthlyBill API that returns the running electricity bill for logged in user,
+            for the given month (YYYY-MM) or the current one
+        '''
+        user = info.context.request.user
+        month = month or timezone.localtime().strftime("%Y-%m")
+
+        data = get_redis().hgetall(BILLING_KEY.format(user.id, month))
+        if not data:
+            return None
+
+        totals = {key: round(float(value), 4) for key, value in data.items()}
+
+        return MonthlyBill(
+            month=month,
+            import_kwh=totals["import_kwh"],
+            export_kwh=totals["export_kwh"],
+            import_cost=totals["import_cost"],
+            export_credit=totals["export_credit"],
+            net_cost=round(totals["import_cost"] - totals["export_credit"], 4),
+            savings=totals["savings"]
         )
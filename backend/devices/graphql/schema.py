@@ -1,4 +1,7 @@
 import strawberry
+from django.conf import settings
+from strawberry.extensions import ParserCache, ValidationCache
+from devices.graphql.extensions import PersistedQueries, QueryCostLimiter
 from devices.graphql.mutations import Mutation as DeviceMutation
 from devices.graphql.queries import Query as DeviceQuery
 from gqlauth.user import arg_mutations as auth_mutations
@@ -15,4 +18,20 @@ class Mutation(DeviceMutation):
     # logout = auth_mutations.RevokeToken.field
     # update_account = auth_mutations.UpdateAccount.field
 
-schema = strawberry.Schema(query=DeviceQuery, mutation=Mutation)
+schema = strawberry.Schema(
+    query=DeviceQuery,
+    mutation=Mutation,
+    extensions=[
+        # must run first so the query text is available for parsing
+        PersistedQueries(
+            ttl=settings.GRAPHQL_PERSISTED_QUERY_TTL_SECONDS,
+            max_query_length=settings.GRAPHQL_PERSISTED_QUERY_MAX_LENGTH,
+        ),
+        QueryCostLimiter(
+            max_cost=settings.GRAPHQL_MAX_QUERY_COST,
+            list_size=settings.GRAPHQL_DEFAULT_LIST_SIZE,
+        ),
+        ParserCache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE),
+        ValidationCache(maxsize=settings.GRAPHQL_DOCUMENT_CACHE_SIZE),
+    ],
+)
@@ -1,3 +1,5 @@
+from typing import Optional
+
 import strawberry_django
 import strawberry
 from strawberry import auto
@@ -48,3 +50,36 @@ class EnergyStats:
     current_storage_flow: int
     net_grid_flow: int
     timestamp: int
+    tick: Optional[int]
+
+@strawberry.type
+class GroupEnergyStats:
+    group_id: int
+    user_count: int
+    current_production: int
+    current_consumption: int
+    current_storage: StorageStats
+    current_storage_flow: int
+    net_grid_flow: int
+    timestamp: int
+    tick: Optional[int]
+
+@strawberry.type
+class DeviceAlert:
+    id: str
+    device_type: str
+    device_id: int
+    kind: str  # "stuck" or "spike"
+    value: int
+    tick: int
+    timestamp: int
+
+@strawberry.type
+class MonthlyBill:
+    month: str  # YYYY-MM
+    import_kwh: float
+    export_kwh: float
+    import_cost: float
+    export_credit: float
+    net_cost: float
+    savings: float
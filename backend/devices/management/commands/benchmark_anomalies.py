@@ -0,0 +1,59 @@
+import random
+import time
+from types import SimpleNamespace
+from django.core.management.base import BaseCommand, CommandError
+
+from devices.anomalies import AnomalyDetector
+from devices.connections import get_redis
+
+BENCHMARK_DEVICE_TYPE = "benchmark"
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the anomaly detector's per-tick overhead (state load, observe, flush) "
+        "against Redis for a synthetic fleet and compare it to the last simulation tick. "
+        "Pass the fleet size of one device type as --devices for a like-for-like comparison."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--devices", type=int, default=100000)
+        parser.add_argument("--ticks", type=int, default=3)
+
+    def handle(self, *args, **options):
+        for option in ("devices", "ticks"):
+            if options[option] < 1:
+                raise CommandError(f"--{option} must be at least 1")
+
+        r = get_redis()
+        state_key = f"anomaly_state:{BENCHMARK_DEVICE_TYPE}"
+        devices = [SimpleNamespace(id=i, user_id=i % 1000) for i in range(1, options["devices"] + 1)]
+
+        try:
+            for tick in range(1, options["ticks"] + 1):
+                started_at = time.perf_counter()
+                detector = AnomalyDetector(r, BENCHMARK_DEVICE_TYPE)
+                loaded_at = time.perf_counter()
+                for device in devices:
+                    detector.observe(device, random.randint(500, 3000), detect_spikes=True)
+                observed_at = time.perf_counter()
+                # alerts are not part of the benchmark, they would go to the real streams
+                detector.alerts = []
+                detector.flush(tick)
+                finished_at = time.perf_counter()
+
+                total = finished_at - started_at
+                self.stdout.write(
+                    f"tick {tick}: load {loaded_at - started_at:.3f}s, "
+                    f"observe {observed_at - loaded_at:.3f}s, flush {finished_at - observed_at:.3f}s, "
+                    f"total {total:.3f}s ({total / len(devices) * 1e6:.1f}us per device)"
+                )
+        finally:
+            r.delete(state_key)
+
+        last_duration = r.hget("simulation:metrics", "last_duration_seconds")
+        if last_duration:
+            self.stdout.write(
+                f"last simulation tick took {float(last_duration):.3f}s; "
+                f"detector overhead for {len(devices)} devices is {total / float(last_duration):.1%} of it"
+            )
@@ -0,0 +1,52 @@
+import os
+import statistics
+import subprocess
+import sys
+import time
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+# what each process type has to import before it can serve requests / run tasks
+PROFILES = {
+    "web": "import django; django.setup(); import config.wsgi, config.urls",
+    "worker": (
+        "import django; django.setup(); "
+        "from config.celery import app; app.loader.import_default_modules()"
+    ),
+    "beat": (
+        "import django; django.setup(); "
+        "from config.celery import app; import django_celery_beat.schedulers"
+    ),
+}
+
+
+class Command(BaseCommand):
+    help = "Measure cold startup time of the web, worker and beat process profiles."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--runs", type=int, default=5)
+        parser.add_argument("profiles", nargs="*", help="web, worker and/or beat (defaults to all)")
+
+    def handle(self, *args, **options):
+        profiles = options["profiles"] or list(PROFILES)
+        for profile in profiles:
+            if profile not in PROFILES:
+                raise CommandError(f"Unknown profile '{profile}'. Must be one of: {list(PROFILES)}")
+
+        for profile in profiles:
+            env = {**os.environ, "PROCESS_TYPE": profile}
+            timings = []
+            for _ in range(options["runs"]):
+                started_at = time.perf_counter()
+                subprocess.run(
+                    [sys.executable, "-c", PROFILES[profile]],
+                    cwd=settings.BASE_DIR,
+                    env=env,
+                    check=True,
+                )
+                timings.append(time.perf_counter() - started_at)
+
+            self.stdout.write(
+                f"{profile}: median {statistics.median(timings):.3f}s, "
+                f"min {min(timings):.3f}s over {len(timings)} runs"
+            )
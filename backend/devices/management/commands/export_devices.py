@@ -0,0 +1,43 @@
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from django.utils.dateparse import parse_datetime
+
+from devices.export import EXPORT_FORMATS, iter_export
+
+
+class Command(BaseCommand):
+    help = "Export all devices of one type as CSV or an Arrow IPC stream."
+
+    def add_arguments(self, parser):
+        parser.add_argument("device_type", help="production, storage or consumption")
+        parser.add_argument("--format", default="csv", choices=EXPORT_FORMATS)
+        parser.add_argument("--output", help="File to write to (defaults to stdout)")
+        parser.add_argument("--user-id", type=int)
+        parser.add_argument("--since", help="Only devices updated at or after this ISO datetime")
+        parser.add_argument("--until", help="Only devices updated before this ISO datetime")
+
+    def handle(self, *args, **options):
+        filters = {"user_id": options["user_id"]}
+        for key in ("since", "until"):
+            if options[key]:
+                filters[key] = parse_datetime(options[key])
+                if filters[key] is None:
+                    raise CommandError(f"Invalid datetime for --{key}: {options[key]}")
+
+        try:
+            chunks = iter_export(options["format"], options["device_type"], **filters)
+            # start the generator so bad arguments fail before the output file is created
+            first_chunk = next(chunks)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        if options["output"]:
+            with open(options["output"], "wb") as output:
+                output.write(first_chunk)
+                for chunk in chunks:
+                    output.write(chunk)
+        else:
+            sys.stdout.buffer.write(first_chunk)
+            for chunk in chunks:
+                sys.stdout.buffer.write(chunk)
+            sys.stdout.buffer.flush()
@@ -1,5 +1,7 @@
 from django.db import models
+from django.db.models.functions import Upper
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import OpClass
 
 User = get_user_model()
 
@@ -8,6 +10,26 @@ STATUS_CHOICES = [
     ("offline", "Offline"),
 ]
 
+class UpperPrefixIndex(models.Index):
+    """
+    Index on UPPER(field) for case-insensitive prefix searches (istartswith).
+    Postgres only uses a btree index for LIKE 'PREFIX%' under a non-C collation when
+    it is built with text_pattern_ops, which the other backends don't understand.
+    """
+    def __init__(self, field_name, name):
+        super().__init__(Upper(field_name), name=name)
+        self.field_name = field_name
+
+    def deconstruct(self):
+        path, _, kwargs = super().deconstruct()
+        return path, (self.field_name,), kwargs
+
+    def create_sql(self, model, schema_editor, using="", **kwargs):
+        if schema_editor.connection.vendor == "postgresql":
+            index = models.Index(OpClass(Upper(self.field_name), name="text_pattern_ops"), name=self.name)
+            return index.create_sql(model, schema_editor, using=using, **kwargs)
+        return super().create_sql(model, schema_editor, using=using, **kwargs)
+
 class Device(models.Model):
     """
     Abstract base model for all device types.
@@ -21,6 +43,8 @@ class Device(models.Model):
 
     class Meta:
         abstract = True
+        # backs the admin's name search, see BaseRestrictedAdmin.get_search_results
+        indexes = [UpperPrefixIndex("name", name="%(class)s_name_upper")]
 
     def __str__(self):
         return f"{self.name} ({self.__class__.__name__})"
@@ -58,3 +82,66 @@ class ConsumptionDevice(Device):
     consumption_rate_watts = models.PositiveIntegerField(
         help_text="Current consumption rate in watts"
     )
+
+class UserGroup(models.Model):
+    """
+    Hierarchical grouping of users (e.g. Feeder -> Neighbourhood -> Region) used for
+    aggregated energy stats. A user's stats roll up into every group it belongs to
+    and all of their ancestors.
+    """
+    name = models.CharField(max_length=100)
+    parent = models.ForeignKey(
+        "self", on_delete=models.CASCADE, null=True, blank=True, related_name="children"
+    )
+    members = models.ManyToManyField(User, blank=True, related_name="energy_groups")
+    operators = models.ManyToManyField(
+        User,
+        blank=True,
+        related_name="operated_energy_groups",
+        help_text="Users allowed to query this group's aggregated stats",
+    )
+
+    def __str__(self):
+        return self.name
+
+class Tariff(models.Model):
+    """
+    Time-of-use electricity tariff. The base prices apply outside of the tariff's
+    rate windows. Prices are per kWh.
+    """
+    name = models.CharField(max_length=100)
+    import_price = models.DecimalField(max_digits=8, decimal_places=4, help_text="Price paid per imported kWh")
+    export_price = models.DecimalField(max_digits=8, decimal_places=4, help_text="Credit per exported kWh")
+    is_default = models.BooleanField(default=False, help_text="Used for users without an assigned tariff")
+
+    class Meta:
+        # billing would otherwise pick an arbitrary default from tick to tick
+        constraints = [
+            models.UniqueConstraint(
+                fields=["is_default"],
+                condition=models.Q(is_default=True),
+                name="single_default_tariff",
+                violation_error_message="Only one tariff can be the default.",
+            )
+        ]
+
+    def __str__(self):
+        return self.name
+
+class TariffRate(models.Model):
+    """
+    Overrides a tariff's prices between start_time and end_time each day.
+    Windows may wrap past midnight (e.g. 22:00 - 06:00).
+    """
+    tariff = models.ForeignKey(Tariff, on_delete=models.CASCADE, related_name="rates")
+    start_time = models.TimeField()
+    end_time = models.TimeField()
+    import_price = models.DecimalField(max_digits=8, decimal_places=4)
+    export_price = models.DecimalField(max_digits=8, decimal_places=4)
+
+class UserTariff(models.Model):
+    """
+    Assigns a tariff to a user.
+    """
+    user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="tariff_assignment")
+    tariff = models.ForeignKey(Tariff, on_delete=models.CASCADE, related_name="assignments")
@@ -1,44 +1,123 @@
 from celery import shared_task
-from .models import ProductionDevice, StorageDevice, ConsumptionDevice
+from redis.exceptions import LockError
+from django.conf import settings
+from .anomalies import AnomalyDetector
+from .billing import BillingEngine
+from .connections import get_redis
+from .models import ProductionDevice, StorageDevice, ConsumptionDevice, UserGroup
 from django.contrib.auth import get_user_model
 from datetime import datetime
 import random
-import redis
 import json
 import time
 
 User = get_user_model()
 
-# Connect to Redis
-r = redis.Redis(host="redis", port=6379, db=0, decode_responses=True)
+SIMULATION_LOCK_KEY = "simulation:lock"
+SIMULATION_TICK_KEY = "simulation:tick"
+SIMULATION_METRICS_KEY = "simulation:metrics"
 
-@shared_task
-def simulate_device_readings():
+# Beat ticks expire after one interval, so the broker drops ticks that were queued
+# behind a slow one instead of running them back to back
+@shared_task(bind=True, expires=settings.SIMULATION_TICK_INTERVAL_SECONDS)
+def simulate_device_readings(self):
+    '''
+        Runs one simulation tick. Ticks hold a Redis lease lock, so a tick that outlives the
+        beat interval is never overlapped by the next one; the overlapping tick is skipped.
+        Ticks whose expiry has passed by the time they start were queued behind a slow tick
+        and are skipped as well.
+    '''
+    r = get_redis()
+
+    if is_expired(self.request.expires):
+        r.hincrby(SIMULATION_METRICS_KEY, "skipped_stale", 1)
+        return
+
+    lock = r.lock(SIMULATION_LOCK_KEY, timeout=settings.SIMULATION_LOCK_TIMEOUT_SECONDS, blocking=False)
+    if not lock.acquire():
+        r.hincrby(SIMULATION_METRICS_KEY, "skipped_overlapping", 1)
+        return
+
+    try:
+        started_at = time.time()
+        metrics = r.hgetall(SIMULATION_METRICS_KEY)
+
+        interval = settings.SIMULATION_TICK_INTERVAL_SECONDS
+        last_started_at = float(metrics.get("last_started_at", started_at - interval))
+        # readings are billed as if they held since the previous tick, but never for
+        # more than two intervals so an outage does not get billed as one long reading
+        elapsed = min(max(started_at - last_started_at, 0), 2 * interval)
+
+        tick = r.incr(SIMULATION_TICK_KEY)
+        run_simulation_tick(tick, lock, elapsed)
+        finished_at = time.time()
+
+        # how far behind schedule this tick started, relative to the previous one
+        lag = max(started_at - last_started_at - interval, 0)
+
+        r.hset(SIMULATION_METRICS_KEY, mapping={
+            "last_tick": tick,
+            "last_started_at": started_at,
+            "last_finished_at": finished_at,
+            "last_duration_seconds": round(finished_at - started_at, 3),
+            "last_lag_seconds": round(lag, 3),
+        })
+    finally:
+        try:
+            lock.release()
+        except LockError:
+            # the lease expired mid-tick; bump SIMULATION_LOCK_TIMEOUT_SECONDS if this shows up
+            pass
+
+def is_expired(expires):
+    '''
+        expires comes from the task message: an ISO datetime string, a datetime or None
+    '''
+    if not expires:
+        return False
+    if isinstance(expires, str):
+        expires = datetime.fromisoformat(expires)
+    return expires.timestamp() < time.time()
+
+def run_simulation_tick(tick, lock, elapsed):
+    r = get_redis()
     user_stats = {}
+    daylight = 6 <= datetime.now().hour <= 18
 
     # Simulate Production Devices
+    detector = AnomalyDetector(r, "production")
     for device in ProductionDevice.objects.filter(status="online"):
         production = (
-            random.randint(1000, 5000) if 6 <= datetime.now().hour <= 18 or not device.is_solar else 0
+            random.randint(1000, 5000) if daylight or not device.is_solar else 0
         )
         device.instantaneous_output_watts = production
         device.save(update_fields=["instantaneous_output_watts"])
+        detector.observe(device, production, stuck=daylight and device.is_solar and production == 0)
 
         uid = device.user_id
         stats = get_or_init_user_stats(user_stats, device.user_id)
         stats["production"] += production
 
+    detector.flush(tick)
+    lock.reacquire()
+
     # Simulate Consumption Devices
+    detector = AnomalyDetector(r, "consumption")
     for device in ConsumptionDevice.objects.filter(status="online"):
         consumption = random.randint(500, 3000)
         device.consumption_rate_watts = consumption
         device.save(update_fields=["consumption_rate_watts"])
+        detector.observe(device, consumption, detect_spikes=True)
 
         uid = device.user_id
         stats = get_or_init_user_stats(user_stats, device.user_id)
         user_stats[uid]["consumption"] += consumption
 
+    detector.flush(tick)
+    lock.reacquire()
+
     # Simulate Storage Devices
+    detector = AnomalyDetector(r, "storage")
     for device in StorageDevice.objects.filter(status="online"):
         flow = random.randint(-1000, 1000)
         new_level = device.current_level_wh + flow
@@ -48,6 +127,7 @@ def simulate_device_readings():
         device.current_level_wh = new_level
         device.charge_discharge_rate_watts = actual_flow
         device.save(update_fields=["current_level_wh", "charge_discharge_rate_watts"])
+        detector.observe(device, new_level, stuck=new_level in (0, device.total_capacity_wh))
 
         uid = device.user_id
 
@@ -57,29 +137,86 @@ def simulate_device_readings():
         stats["storage_flow"] += actual_flow
         stats["storage_count"] += 1
 
-    # Compute and store final energy stats per user 
-    for uid, stats in user_stats.items():
-        current_production = stats.get("production", 0)
-        current_consumption = stats.get("consumption", 0)
-        total_capacity_wh = stats.get("storage_total", 0)
-        current_level_wh = stats.get("storage_level", 0)
-        flow = stats.get("storage_flow", 0)
-        count = stats.get("storage_count", 0)
-
-        energy_stats = {
-            "current_production": current_production,
-            "current_consumption": current_consumption,
-            "current_storage": {
-                "total_capacity_wh": total_capacity_wh,
-                "current_level_wh": current_level_wh,
-                "percentage": (current_level_wh / total_capacity_wh) * 100 if total_capacity_wh else 0
-            },
-            "current_storage_flow": flow,
-            "net_grid_flow": current_consumption - current_production - flow,
-            "timestamp": int(time.time())
-        }
+    detector.flush(tick)
+    lock.reacquire()
 
+    # Compute and store final energy stats per user, then roll them up into groups
+    timestamp = int(time.time())
+    billing = BillingEngine(r, elapsed)
+
+    for uid, stats in user_stats.items():
+        energy_stats = build_energy_stats(stats, timestamp, tick)
         r.set(f"energy_stats:{uid}", json.dumps(energy_stats))
+        billing.add(uid, energy_stats)
+
+    store_group_energy_stats(r, user_stats, timestamp, tick)
+    billing.flush()
+
+def store_group_energy_stats(r, user_stats, timestamp, tick):
+    '''
+        Adds each user's stats to every group it rolls up into (see get_user_group_ids),
+        counting the user once per group, and stores them as group_energy_stats:<id>.
+    '''
+    user_groups = get_user_group_ids()
+    group_stats = {}
+
+    for uid, stats in user_stats.items():
+        for gid in user_groups.get(uid, ()):
+            group = get_or_init_group_stats(group_stats, gid)
+            for key, value in stats.items():
+                group[key] += value
+            group["user_count"] += 1
+
+    for gid, stats in group_stats.items():
+        energy_stats = build_energy_stats(stats, timestamp, tick)
+        energy_stats["user_count"] = stats["user_count"]
+        r.set(f"group_energy_stats:{gid}", json.dumps(energy_stats))
+
+def build_energy_stats(stats, timestamp, tick):
+    current_production = stats.get("production", 0)
+    current_consumption = stats.get("consumption", 0)
+    total_capacity_wh = stats.get("storage_total", 0)
+    current_level_wh = stats.get("storage_level", 0)
+    flow = stats.get("storage_flow", 0)
+
+    return {
+        "current_production": current_production,
+        "current_consumption": current_consumption,
+        "current_storage": {
+            "total_capacity_wh": total_capacity_wh,
+            "current_level_wh": current_level_wh,
+            "percentage": (current_level_wh / total_capacity_wh) * 100 if total_capacity_wh else 0
+        },
+        "current_storage_flow": flow,
+        "net_grid_flow": current_consumption - current_production - flow,
+        "timestamp": timestamp,
+        "tick": tick
+    }
+
+def get_user_group_ids():
+    '''
+        Maps each user id to the ids of all groups its stats roll up into:
+        the groups it is a member of plus all of their ancestors.
+    '''
+    parents = dict(UserGroup.objects.values_list("id", "parent_id"))
+    chains = {}
+
+    def group_chain(gid):
+        if gid not in chains:
+            chain = []
+            current = gid
+            # guard against accidental cycles in the parent links
+            while current is not None and current not in chain:
+                chain.append(current)
+                current = parents.get(current)
+            chains[gid] = chain
+        return chains[gid]
+
+    user_groups = {}
+    memberships = UserGroup.members.through.objects.values_list("user_id", "usergroup_id")
+    for uid, gid in memberships:
+        user_groups.setdefault(uid, set()).update(group_chain(gid))
+    return user_groups
 
 def get_or_init_user_stats(user_stats, uid):
     return user_stats.setdefault(uid, {
@@ -89,4 +226,15 @@ def get_or_init_user_stats(user_stats, uid):
         "storage_level": 0,
         "storage_flow": 0,
         "storage_count": 0,
+    })
+
+def get_or_init_group_stats(group_stats, gid):
+    return group_stats.setdefault(gid, {
+        "production": 0,
+        "consumption": 0,
+        "storage_total": 0,
+        "storage_level": 0,
+        "storage_flow": 0,
+        "storage_count": 0,
+        "user_count": 0,
     })
\ No newline at end of file
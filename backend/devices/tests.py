@@ -1,3 +1,356 @@
-from django.test import TestCase
+import csv
+import hashlib
+import io
+import json
+from datetime import datetime, time, timezone
+from decimal import Decimal
+from types import SimpleNamespace
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.models import AnonymousUser
+from django.test import SimpleTestCase, override_settings
+
+from devices import admin as device_admin, anomalies, billing, export, tasks
+from devices.graphql import extensions
+from devices.graphql.schema import schema
+from devices.models import ProductionDevice, StorageDevice, Tariff, TariffRate, UserGroup, UserTariff
+
+
+class FakeClock:
+    def __init__(self, now):
+        self.now = now
+
+    def time(self):
+        return self.now
+
+
+@override_settings(SIMULATION_TICK_INTERVAL_SECONDS=60)
+class SimulationTickCoordinationTests(SimpleTestCase):
+    '''
+        simulate_device_readings with a mocked clock and Redis: the previous tick
+        started at t=1000 and took 40s.
+    '''
+
+    def setUp(self):
+        self.clock = FakeClock(1060)
+        self.metrics = {"last_started_at": "1000", "last_finished_at": "1040"}
+        self.counters = {}
+
+        self.r = mock.MagicMock()
+        self.r.hgetall.return_value = self.metrics
+        self.r.incr.return_value = 2
+        self.r.hset.side_effect = lambda key, mapping: self.metrics.update(mapping)
+        self.r.hincrby.side_effect = lambda key, field, amount: self.counters.update(
+            {field: self.counters.get(field, 0) + amount}
+        )
+        self.lock = self.r.lock.return_value
+        self.lock.acquire.return_value = True
+
+        patches = [
+            mock.patch.object(tasks, "get_redis", return_value=self.r),
+            mock.patch.object(tasks.time, "time", self.clock.time),
+            mock.patch.object(tasks, "run_simulation_tick"),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def run_tick(self, scheduled_at):
+        expires = datetime.fromtimestamp(scheduled_at + 60, tz=timezone.utc).isoformat()
+        tasks.simulate_device_readings.push_request(expires=expires)
+        try:
+            tasks.simulate_device_readings.run()
+        finally:
+            tasks.simulate_device_readings.pop_request()
+
+    def test_on_schedule_tick_after_slow_tick_runs(self):
+        self.run_tick(scheduled_at=1060)
+
+        tasks.run_simulation_tick.assert_called_once()
+        self.assertEqual(self.metrics["last_tick"], 2)
+        self.assertEqual(self.metrics["last_started_at"], 1060)
+        self.assertEqual(self.counters, {})
+
+    def test_tick_queued_behind_slow_tick_is_skipped(self):
+        # scheduled at t=1060 but only picked up after a slow tick finished at t=1130
+        self.clock.now = 1130
+        self.run_tick(scheduled_at=1060)
+
+        tasks.run_simulation_tick.assert_not_called()
+        self.r.lock.assert_not_called()
+        self.assertEqual(self.counters, {"skipped_stale": 1})
+
+    def test_overlapping_tick_is_skipped(self):
+        self.lock.acquire.return_value = False
+        self.run_tick(scheduled_at=1060)
+
+        tasks.run_simulation_tick.assert_not_called()
+        self.assertEqual(self.counters, {"skipped_overlapping": 1})
+
+
+class PersistedQueriesTests(SimpleTestCase):
+    def setUp(self):
+        self.r = mock.MagicMock()
+        self.r.get.return_value = None
+        patch = mock.patch.object(extensions, "get_redis", return_value=self.r)
+        patch.start()
+        self.addCleanup(patch.stop)
+
+    def execute(self, query):
+        query_hash = hashlib.sha256(query.encode()).hexdigest()
+        body = {"query": query, "extensions": {"persistedQuery": {"version": 1, "sha256Hash": query_hash}}}
+        request = SimpleNamespace(method="POST", content_type="application/json", body=json.dumps(body).encode())
+        return query_hash, schema.execute_sync(query, context_value=SimpleNamespace(request=request))
+
+    def test_valid_query_is_stored_with_ttl(self):
+        query_hash, result = self.execute("{ __typename }")
+
+        self.assertIsNone(result.errors)
+        self.r.set.assert_called_once_with(
+            f"persisted_query:{query_hash}", "{ __typename }", ex=86400
+        )
+
+    def test_invalid_query_is_not_stored(self):
+        _, result = self.execute("{ notAField }")
+
+        self.assertTrue(result.errors)
+        self.r.set.assert_not_called()
+
+    def test_query_over_max_length_is_rejected(self):
+        _, result = self.execute("{ __typename }" + " " * 10000)
+
+        self.assertIn("limited to 10000 characters", result.errors[0].message)
+        self.r.set.assert_not_called()
+
+
+class AnomalyDetectorTests(SimpleTestCase):
+    def setUp(self):
+        self.r = mock.MagicMock()
+        self.r.hscan_iter.return_value = iter([])
+
+    def test_spike_on_steady_load_is_reported(self):
+        device = SimpleNamespace(id=1, user_id=7)
+        for _ in range(anomalies.WARMUP_TICKS):
+            detector = anomalies.AnomalyDetector(self.r, "consumption")
+            detector.observe(device, 150, detect_spikes=True)
+            self.assertEqual(detector.alerts, [])
+            self.r.hscan_iter.return_value = iter(
+                (str(device_id), value) for device_id, value in detector.updated.items()
+            )
+
+        detector = anomalies.AnomalyDetector(self.r, "consumption")
+        detector.observe(device, 3000, detect_spikes=True)
+
+        self.assertEqual([alert["kind"] for alert in detector.alerts], ["spike"])
+
+    def test_state_is_written_in_batches(self):
+        detector = anomalies.AnomalyDetector(self.r, "consumption")
+        for device_id in range(5):
+            detector.observe(SimpleNamespace(id=device_id, user_id=1), 100)
+
+        with mock.patch.object(anomalies, "STATE_WRITE_BATCH", 2):
+            detector.flush(tick=1)
+
+        batches = [call.kwargs["mapping"] for call in self.r.hset.call_args_list]
+        self.assertEqual([len(batch) for batch in batches], [2, 2, 1])
+
+
+class DeviceAdminSearchTests(SimpleTestCase):
+    def test_multi_word_search_is_one_prefix(self):
+        model_admin = device_admin.ProductionDeviceAdmin(ProductionDevice, device_admin.admin.site)
+
+        queryset, may_have_duplicates = model_admin.get_search_results(
+            None, ProductionDevice.objects.all(), " Solar Panel "
+        )
+
+        self.assertFalse(may_have_duplicates)
+        [where] = queryset.query.where.children
+        self.assertEqual(where.connector, "OR")
+        name_lookup, owner_lookup = where.children
+        self.assertEqual((name_lookup.lookup_name, name_lookup.rhs), ("istartswith", "Solar Panel"))
+        # owners stay a subquery instead of being loaded into an IN list
+        self.assertEqual(owner_lookup.lookup_name, "in")
+        [username_lookup] = owner_lookup.rhs.where.children
+        self.assertEqual((username_lookup.lookup_name, username_lookup.rhs), ("startswith", "Solar Panel"))
+
+
+class GroupEnergyStatsTests(SimpleTestCase):
+    # 1 is the root with sub-groups 2 and 3, 4 sits below 2, and 5 and 6 are
+    # accidentally each other's parent
+    PARENTS = [(1, None), (2, 1), (3, 1), (4, 2), (5, 6), (6, 5)]
+    MEMBERSHIPS = [(10, 2), (10, 3), (11, 4), (12, 5)]
+
+    def setUp(self):
+        patches = [
+            mock.patch.object(UserGroup.objects, "values_list", return_value=self.PARENTS),
+            mock.patch.object(
+                UserGroup.members.through.objects, "values_list", return_value=self.MEMBERSHIPS
+            ),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_user_group_ids_include_ancestors(self):
+        self.assertEqual(tasks.get_user_group_ids(), {
+            10: {1, 2, 3},
+            11: {1, 2, 4},
+            12: {5, 6},
+        })
+
+    def test_stats_are_rolled_up_once_per_user(self):
+        user_stats = {}
+        for uid, production, consumption in [(10, 1000, 400), (11, 500, 700), (12, 200, 100), (13, 50, 50)]:
+            stats = tasks.get_or_init_user_stats(user_stats, uid)
+            stats["production"] = production
+            stats["consumption"] = consumption
+
+        r = mock.MagicMock()
+        tasks.store_group_energy_stats(r, user_stats, timestamp=1000, tick=7)
+
+        stored = {key: json.loads(value) for (key, value), _ in r.set.call_args_list}
+        self.assertEqual(
+            {key: (stats["user_count"], stats["current_production"], stats["current_consumption"])
+             for key, stats in stored.items()},
+            {
+                "group_energy_stats:1": (2, 1500, 1100),
+                "group_energy_stats:2": (2, 1500, 1100),
+                "group_energy_stats:3": (1, 1000, 400),
+                "group_energy_stats:4": (1, 500, 700),
+                "group_energy_stats:5": (1, 200, 100),
+                "group_energy_stats:6": (1, 200, 100),
+            },
+        )
+        self.assertEqual(stored["group_energy_stats:1"]["net_grid_flow"], -400)
+        self.assertEqual(stored["group_energy_stats:1"]["tick"], 7)
+
+    def test_anonymous_user_is_rejected(self):
+        request = SimpleNamespace(user=AnonymousUser(), method="POST", content_type="application/json", body=b"{}")
+        with mock.patch.object(UserGroup.objects, "filter") as filter_groups:
+            result = schema.execute_sync(
+                "{ groupEnergyStats(groupId: 1) { userCount } }",
+                context_value=SimpleNamespace(request=request),
+            )
+
+        self.assertIn("must be logged in", result.errors[0].message)
+        filter_groups.assert_not_called()
+
+
+class DeviceExportTests(SimpleTestCase):
+    def setUp(self):
+        updated_at = datetime(2025, 5, 1, 12, 0, tzinfo=timezone.utc)
+        self.rows = [
+            (i, f"Battery {i}", "online", 3, updated_at, updated_at, 10000, 5000 + i, -200)
+            for i in range(1, 6)
+        ]
+        fields = StorageDevice._meta.concrete_fields
+        patches = [
+            mock.patch.object(export, "get_export_rows", side_effect=lambda *args, **kwargs: (fields, iter(self.rows))),
+            mock.patch.object(export, "CHUNK_SIZE", 2),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_csv_is_streamed_in_chunks(self):
+        chunks = list(export.iter_export("csv", "storage"))
+
+        # header + 2 rows, 2 rows, the last row
+        self.assertEqual([chunk.count(b"\n") for chunk in chunks], [3, 2, 1])
+        rows = list(csv.reader(io.StringIO(b"".join(chunks).decode())))
+        self.assertEqual(rows[0][:4], ["id", "name", "status", "user_id"])
+        self.assertEqual(rows[1][:2], ["1", "Battery 1"])
+        self.assertEqual(len(rows), 6)
+
+    def test_arrow_is_streamed_in_record_batches(self):
+        import pyarrow as pa
+
+        chunks = list(export.iter_export("arrow", "storage"))
+        reader = pa.ipc.open_stream(b"".join(chunks))
+        batches = list(reader)
+
+        self.assertEqual([batch.num_rows for batch in batches], [2, 2, 1])
+        self.assertEqual(reader.schema.field("user_id").type, pa.int64())
+        self.assertEqual(reader.schema.field("updated_at").type, pa.timestamp("us", tz="UTC"))
+        table = pa.Table.from_batches(batches)
+        self.assertEqual(table.column("current_level_wh").to_pylist(), [5001, 5002, 5003, 5004, 5005])
+
+
+class BillingTests(SimpleTestCase):
+    # tariff 1 has a night rate that wraps past midnight, tariff 2 (the default) has a
+    # window with start == end, which covers the whole day
+    TARIFFS = [
+        SimpleNamespace(id=1, import_price=Decimal("0.30"), export_price=Decimal("0.05")),
+        SimpleNamespace(id=2, import_price=Decimal("0.50"), export_price=Decimal("0.01")),
+    ]
+    RATES = [
+        SimpleNamespace(
+            tariff_id=1, start_time=time(22), end_time=time(6),
+            import_price=Decimal("0.10"), export_price=Decimal("0.02"),
+        ),
+        SimpleNamespace(
+            tariff_id=2, start_time=time(0), end_time=time(0),
+            import_price=Decimal("0.20"), export_price=Decimal("0.04"),
+        ),
+    ]
+
+    def setUp(self):
+        default_tariff = mock.MagicMock()
+        default_tariff.values_list.return_value.first.return_value = 2
+        patches = [
+            mock.patch.object(Tariff.objects, "all", return_value=self.TARIFFS),
+            mock.patch.object(Tariff.objects, "filter", return_value=default_tariff),
+            mock.patch.object(TariffRate.objects, "all", return_value=self.RATES),
+            mock.patch.object(UserTariff.objects, "values_list", return_value=[(10, 1)]),
+        ]
+        for patch in patches:
+            patch.start()
+            self.addCleanup(patch.stop)
+
+    def test_price_tables(self):
+        import_prices, export_prices = billing.build_price_tables()[1]
+
+        slot = lambda hour, minute=0: billing.get_slot(time(hour, minute))
+        self.assertEqual(import_prices[slot(21, 45)], 0.30)
+        self.assertEqual(import_prices[slot(22)], 0.10)
+        self.assertEqual(import_prices[slot(0)], 0.10)
+        self.assertEqual(export_prices[slot(5, 45)], 0.02)
+        self.assertEqual(import_prices[slot(6)], 0.30)
+        self.assertEqual(export_prices[slot(6)], 0.05)
+
+        import_prices, export_prices = billing.build_price_tables()[2]
+        self.assertEqual(set(import_prices), {0.20})
+        self.assertEqual(set(export_prices), {0.04})
+
+    def test_add_and_flush(self):
+        r = mock.MagicMock()
+        pipe = r.pipeline.return_value
+        totals = {}
+        pipe.hincrbyfloat.side_effect = lambda key, field, amount: totals.update(
+            {(key, field): totals.get((key, field), 0) + amount}
+        )
+
+        with mock.patch.object(billing.timezone, "localtime", return_value=datetime(2025, 5, 1, 23, 0)):
+            engine = billing.BillingEngine(r, elapsed_seconds=1800)
+        # tariff 1 at the night rate: imports 2000 W for half an hour
+        engine.add(10, {"net_grid_flow": 2000, "current_consumption": 3000})
+        # no tariff assigned, so the default: exports 1000 W for half an hour
+        engine.add(11, {"net_grid_flow": -1000, "current_consumption": 500})
+        engine.flush()
+
+        pipe.execute.assert_called_once()
+        expected = {
+            "billing:10:2025-05": {
+                "import_kwh": 1.0, "export_kwh": 0, "import_cost": 0.10, "export_credit": 0,
+                # 1.5 kWh consumed at 0.10, minus 0.10 paid
+                "savings": 0.05,
+            },
+            "billing:11:2025-05": {
+                "import_kwh": 0, "export_kwh": 0.5, "import_cost": 0, "export_credit": 0.02,
+                # 0.25 kWh consumed at 0.20, plus 0.02 export credit
+                "savings": 0.07,
+            },
+        }
+        for key, fields in expected.items():
+            for field, value in fields.items():
+                self.assertAlmostEqual(totals[(key, field)], value, msg=f"{key} {field}")
@@ -1,3 +1,47 @@
-from django.shortcuts import render
+from django.http import HttpResponseBadRequest, HttpResponseForbidden, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
+from django.views.decorators.http import require_GET
 
-# Create your views here.
+from devices.export import iter_export
+
+EXPORT_CONTENT_TYPES = {
+    "csv": "text/csv",
+    "arrow": "application/vnd.apache.arrow.stream",
+}
+
+
+@require_GET
+def export_devices(request, device_type):
+    '''
+        Streams all devices of device_type as CSV (default) or Arrow IPC (?format=arrow).
+        Supports ?user_id=, ?since= and ?until= (ISO datetimes, on updated_at) filters.
+        Only available to superusers.
+    '''
+    if not request.user.is_superuser:
+        return HttpResponseForbidden()
+
+    export_format = request.GET.get("format", "csv")
+    filters = {}
+    try:
+        if request.GET.get("user_id"):
+            filters["user_id"] = int(request.GET["user_id"])
+        for key in ("since", "until"):
+            if request.GET.get(key):
+                filters[key] = parse_datetime(request.GET[key])
+                if filters[key] is None:
+                    raise ValueError(f"Invalid datetime for {key}: {request.GET[key]}")
+
+        chunks = iter_export(export_format, device_type, **filters)
+        # start the generator so bad device types fail before the response is sent
+        first_chunk = next(chunks)
+    except ValueError as e:
+        return HttpResponseBadRequest(str(e))
+
+    def stream():
+        yield first_chunk
+        yield from chunks
+
+    response = StreamingHttpResponse(stream(), content_type=EXPORT_CONTENT_TYPES[export_format])
+    extension = "arrows" if export_format == "arrow" else export_format
+    response["Content-Disposition"] = f'attachment; filename="{device_type}_devices.{extension}"'
+    return response
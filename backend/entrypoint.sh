@@ -1,5 +1,11 @@
 #!/bin/bash
 
+# Set SKIP_SETUP=1 to start serving straight away, e.g. for extra replicas
+# once migrations and seed data are in place.
+if [ "$SKIP_SETUP" = "1" ]; then
+    exec "$@"
+fi
+
 echo "Running setup tasks..."
 
 # Make sure migrations exist